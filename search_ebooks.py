@@ -1,11 +1,18 @@
 import os
 import shutil
-import requests
-from bs4 import BeautifulSoup
-from ddgs import DDGS
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from thefuzz import fuzz
+import errno
+import hashlib
+import requests_cache
+from urllib.parse import urlparse, parse_qs
+from requests.adapters import HTTPAdapter
+from requests.exceptions import HTTPError
+from urllib3.util.retry import Retry
+from selectolax.lexbor import LexborHTMLParser
+from diskcache import Cache
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from rapidfuzz import fuzz, process
 import json
+import orjson
 import argparse
 import re
 import logging
@@ -17,15 +24,84 @@ import termios
 import tty
 from colorama import Fore, Style, init
 import time
+import functools
+import threading
+import random
 
 init(autoreset=True)
 
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "book_searcher")
+CACHE_TTL = 60 * 60 * 24 * 7
+SEARCH_URL = "https://html.duckduckgo.com/html/"
+SEARCH_RETRIES = 4
+SEARCH_PAGE_RESULTS = 10
+MAX_IN_FLIGHT = 16
+MAX_IN_FLIGHT_PER_HOST = 4
+LLM_BATCH_SIZE = 16
+LLM_KEEP_ALIVE = "10m"
+HASH_PREFIX_BYTES = 64 * 1024
+EBOOK_EXTENSIONS = (".epub", ".pdf", ".mobi", ".azw", ".azw3", ".djvu", ".fb2")
+# Filename words that say nothing about the book itself
+QUERY_STOPWORDS = {"book", "ebook", "pdf", "epub", "mobi", "azw3", "djvu", "ספר"}
+MIN_QUERY_CHARS = 3
+_SEARCH_LOCKS = {}
+# Queries that already failed this run; threads waiting on the same lock skip them instead of retrying again
+_SEARCH_FAILURES = {}
+HTTP_SEM = threading.BoundedSemaphore(MAX_IN_FLIGHT)
+_HOST_SEMS = {}
+_RESOURCES = {}
+_RESOURCES_LOCK = threading.Lock()
+
+def _new_session():
+    session = requests_cache.CachedSession(os.path.join(CACHE_DIR, "http_cache"), backend="sqlite", expire_after=CACHE_TTL, cache_control=True)
+    session.headers.update({
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+        "Accept-Language": "he,en-US;q=0.7,en;q=0.3"
+    })
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=Retry(total=4, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], respect_retry_after_header=True))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def _per_process(name, factory):
+    # sqlite connections and sockets can't cross a fork, so each worker process builds its own
+    key = (os.getpid(), name)
+    res = _RESOURCES.get(key)
+    if res is None:
+        with _RESOURCES_LOCK:
+            res = _RESOURCES.get(key)
+            if res is None: res = _RESOURCES[key] = factory()
+    return res
+
+def get_session(): return _per_process("session", _new_session)
+
+def get_disk_cache(): return _per_process("disk_cache", lambda: Cache(os.path.join(CACHE_DIR, "results")))
+
+def fetch(url, **kwargs):
+    # File workers x site workers can outnumber what the sites tolerate; cap requests overall and per host
+    host_sem = _HOST_SEMS.setdefault(urlparse(url).netloc, threading.BoundedSemaphore(MAX_IN_FLIGHT_PER_HOST))
+    with host_sem, HTTP_SEM:
+        return get_session().get(url, **kwargs)
+
 SITES = [
-    {"name": "evrit", "domain": "e-vrit.co.il", "id_regex": r"/Product/(\d+)", "author_regex": r"/Author/(\d+)", "group_regex": r"/Group/(\d+)"},
-    {"name": "steimatzky", "domain": "steimatzky.co.il", "id_regex": r"/(\d+)"},
-    {"name": "simania", "domain": "simania.co.il", "id_regex": r"/book/(\d+)"}
+    {"name": "evrit", "domain": "e-vrit.co.il", "id_regex": re.compile(r"/Product/(\d+)"), "author_regex": re.compile(r"/Author/(\d+)"), "group_regex": re.compile(r"/Group/(\d+)")},
+    {"name": "steimatzky", "domain": "steimatzky.co.il", "id_regex": re.compile(r"/(\d+)")},
+    {"name": "simania", "domain": "simania.co.il", "id_regex": re.compile(r"/book/(\d+)")}
 ]
 
+# One site-restricted query covers every site instead of one query per site
+SITES_FILTER = "(" + " OR ".join(f"site:{site['domain']}" for site in SITES) + ")"
+
+_CLEAN_TABLE = str.maketrans("_.", "  ")
+_UNSAFE_TABLE = str.maketrans("", "", '/\\*?:"<>|')
+
+_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+_JSON_LIST_RE = re.compile(r"\[.*\]", re.DOTALL)
+_PRODUCT_LIST_RE = re.compile(r'"ProductListItems":\s*(\[.*?\])', re.DOTALL)
+_TITLE_AUTHOR_RE = re.compile(r'(.*?)\s*\((.*?)\)')
+_PARENS_RE = re.compile(r'\(.*?\)')
+
 class BookSearcher:
     def __init__(self, args):
         self.args = args
@@ -36,15 +112,15 @@ class BookSearcher:
     def load_state(self):
         if os.path.exists(self.json_path):
             try:
-                with open(self.json_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
+                with open(self.json_path, "rb") as f:
+                    data = orjson.loads(f.read())
                     return {item["original_filename"]: item for item in data}
             except Exception: pass
         return {}
 
     def save_state(self):
-        with open(self.json_path, "w", encoding="utf-8") as f:
-            json.dump(list(self.state.values()), f, ensure_ascii=False, indent=4)
+        with open(self.json_path, "wb") as f:
+            f.write(orjson.dumps(list(self.state.values()), option=orjson.OPT_INDENT_2))
 
     def check_input(self):
         if sys.stdin in select.select([sys.stdin], [], [], 0)[0]:
@@ -57,16 +133,44 @@ class BookSearcher:
         if not os.path.exists(self.args.input):
             print(f"{Fore.RED}Error: Input path '{self.args.input}' does not exist.{Style.RESET_ALL}")
             return
-        all_f = [f for f in os.listdir(self.args.input) if os.path.isfile(os.path.join(self.args.input, f)) and not f.startswith(".")]
-        files = [os.path.join(self.args.input, f) for f in all_f if f not in self.state and not f.endswith(".json")]
+        with os.scandir(self.args.input) as entries:
+            files = [e.path for e in entries if not e.name.startswith(".") and e.name.lower().endswith(EBOOK_EXTENSIONS) and e.name not in self.state and e.is_file()]
+        # Renamed copies of books that were already found are recorded as duplicates instead of searched again
+        found_hashes = {e["content_hash"]: e["original_filename"] for e in self.state.values() if e.get("found") and e.get("content_hash")}
+        hashes = {f: content_hash(f) for f in files}
+        dups = {f: found_hashes[hashes[f]] for f in files if hashes[f] in found_hashes}
+        files = [f for f in files if f not in dups]
+        for f, dup_of in dups.items():
+            fname = os.path.basename(f)
+            print(f"{Fore.BLUE}Skipping: {Style.DIM}{fname}{Style.RESET_ALL} {Fore.BLUE}(same file as {dup_of}){Style.RESET_ALL}")
+            self.state[fname] = {
+                "original_filename": fname,
+                "new_path": None,
+                "found": False,
+                "id": None,
+                "llm_guess": None,
+                "metadata": None,
+                "duplicate_of": dup_of,
+                "content_hash": hashes[f],
+                "timestamp": datetime.now()
+            }
         if not files:
+            self.save_state()
             print(f"{Fore.BLUE}No new files to process.{Style.RESET_ALL}")
             return
         print(f"{Fore.CYAN}Found {len(files)} files. Press p/q to stop.{Style.RESET_ALL}")
         old_settings = termios.tcgetattr(sys.stdin)
         tty.setcbreak(sys.stdin.fileno())
         try:
-            with ThreadPoolExecutor(max_workers=self.args.threads) as executor:
+            if self.args.use_llm:
+                print(f"{Fore.CYAN}Extracting metadata with {self.args.model}...{Style.RESET_ALL}")
+                names = [os.path.splitext(os.path.basename(f))[0] for f in files]
+                for i in range(0, len(names), LLM_BATCH_SIZE):
+                    self.check_input()
+                    if self.stop_requested: return
+                    prefetch_metadata_with_llm(names[i:i + LLM_BATCH_SIZE], self.args.model, self.args.verbose)
+            pool_cls = ProcessPoolExecutor if self.args.processes else ThreadPoolExecutor
+            with pool_cls(max_workers=self.args.threads) as executor:
                 futures = {executor.submit(process_book, f, self.args.use_llm, self.args.model, self.args.verbose): f for f in files}
                 for future in as_completed(futures):
                     if self.stop_requested: break
@@ -85,49 +189,93 @@ class BookSearcher:
                         "id": res.get("id") if is_found else None,
                         "llm_guess": book_data["llm_guess"],
                         "metadata": res,
-                        "timestamp": datetime.now().isoformat()
+                        "content_hash": hashes[futures[future]],
+                        "timestamp": datetime.now()
                     }
                     self.save_state()
         finally:
             termios.tcsetattr(sys.stdin, termios.TCSADRAIN, old_settings)
             self.save_state()
 
-def clean_filename(f): return os.path.splitext(f)[0].replace("_"," ").replace("."," ").strip()
+def content_hash(path):
+    # Size plus the first 64KB tells ebooks apart without reading whole files
+    try:
+        h = hashlib.blake2b(str(os.path.getsize(path)).encode(), digest_size=8)
+        with open(path, "rb") as f: h.update(f.read(HASH_PREFIX_BYTES))
+        return h.hexdigest()
+    except OSError: return None
+
+def clean_filename(f): return os.path.splitext(f)[0].translate(_CLEAN_TABLE).strip()
+
+def safe_name(n): return n.translate(_UNSAFE_TABLE).strip().replace(" ", "_")
 
 def normalize_hebrew(text):
     if not text: return ""
     # Replace geresh with apostrophe, and double geresh with quotes
     return text.replace("׳", "'").replace("״", '"').replace("`", "'").strip()
 
+def fuzzy_ratio(query, title, cutoff):
+    q, t = query.casefold().strip(), title.casefold().strip()
+    if not q or not t: return 0
+    # Exact or contained titles are a full match; skip the edit-distance work
+    if q == t or q in t or t in q: return 100
+    return fuzz.token_set_ratio(q, t, score_cutoff=cutoff)
+
+def best_match(query, titles, cutoff):
+    # Scores all candidates in one rapidfuzz call; returns the index of the best one at or above cutoff
+    hit = process.extractOne(query, titles, scorer=fuzz.token_set_ratio, processor=str.casefold, score_cutoff=cutoff)
+    return hit[2] if hit else None
+
+def llm_cache_key(clean_f, model): return f"llm::{model}::{clean_f}"
+
+@functools.lru_cache(maxsize=4096)
 def extract_metadata_with_llm(f, model, v):
     try:
         clean_f = clean_filename(f)
+        cached = get_disk_cache().get(llm_cache_key(clean_f, model))
+        if cached is not None: return cached
         prompt = "Extract book title and author from Hebrew/English filename: " + clean_f + ". Return ONLY JSON like {\"title\":\"\", \"author\":\"\"}"
-        r = ollama.chat(model=model, messages=[{"role":"user", "content":prompt}])
-        m = re.search(r"\{.*\}", r["message"]["content"], re.DOTALL)
+        r = ollama.chat(model=model, messages=[{"role":"user", "content":prompt}], keep_alive=LLM_KEEP_ALIVE)
+        m = _JSON_RE.search(r["message"]["content"])
         if m:
             d = json.loads(m.group(0))
             if v >= 2: print(f"{Fore.BLACK}{Style.BRIGHT}  LLM: {d}{Style.RESET_ALL}")
-            return d.get("title"), d.get("author")
+            res = (d.get("title"), d.get("author"))
+            get_disk_cache().set(llm_cache_key(clean_f, model), res, expire=CACHE_TTL)
+            return res
     except Exception: pass
     return None, None
 
+def prefetch_metadata_with_llm(names, model, v):
+    # One prompt for a whole chunk of filenames; results land in the disk cache for extract_metadata_with_llm
+    cache = get_disk_cache()
+    todo = [c for c in dict.fromkeys(clean_filename(n) for n in names) if llm_cache_key(c, model) not in cache]
+    if not todo: return
+    try:
+        prompt = "Extract book title and author from each Hebrew/English filename in this JSON list: " + json.dumps(todo, ensure_ascii=False) + ". Return ONLY a JSON list with one object per filename, in the same order, like [{\"title\":\"\", \"author\":\"\"}]"
+        r = ollama.chat(model=model, messages=[{"role":"user", "content":prompt}], keep_alive=LLM_KEEP_ALIVE)
+        m = _JSON_LIST_RE.search(r["message"]["content"])
+        if not m: return
+        items = json.loads(m.group(0))
+        # A misaligned answer can't be trusted; those files fall back to one prompt each
+        if not isinstance(items, list) or len(items) != len(todo): return
+        for clean_f, d in zip(todo, items):
+            if not isinstance(d, dict): continue
+            if v >= 2: print(f"{Fore.BLACK}{Style.BRIGHT}  LLM: {d}{Style.RESET_ALL}")
+            cache.set(llm_cache_key(clean_f, model), (d.get("title"), d.get("author")), expire=CACHE_TTL)
+    except Exception as e:
+        if v >= 1: print(f"DEBUG: LLM batch error: {e}")
+
 def get_book_details(url, site, site_config, target_title=None, v=0):
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-            "Accept-Language": "he,en-US;q=0.7,en;q=0.3"
-        }
-        r = requests.get(url, headers=headers, timeout=10)
-        r.encoding = "utf-8"
+        r = fetch(url, timeout=10)
         if r.status_code != 200: return None
-        s = BeautifulSoup(r.text, "html.parser")
+        s = LexborHTMLParser(r.content)
         t, a, bid = "", "", None
         
         # Determine page type
         page_type = "unknown"
-        if "/Product/" in url or (site == "steimatzky" and re.search(r"/\d+", url)):
+        if "/Product/" in url or (site == "steimatzky" and site_config["id_regex"].search(url)):
             page_type = "book"
         elif "/Author/" in url:
             page_type = "author"
@@ -135,10 +283,10 @@ def get_book_details(url, site, site_config, target_title=None, v=0):
             page_type = "group"
 
         # Try JSON-LD first
-        scripts = s.find_all("script", type="application/ld+json")
+        scripts = s.css('script[type="application/ld+json"]')
         for script in scripts:
             try:
-                data = json.loads(script.string)
+                data = json.loads(script.text())
                 if isinstance(data, list): data = data[0]
                 if data.get("@type") == "Book":
                     t = data.get("name", t)
@@ -153,88 +301,135 @@ def get_book_details(url, site, site_config, target_title=None, v=0):
 
         if site == "evrit":
             if not t:
-                t_tag = s.find("h1")
-                if t_tag: t = t_tag.text.strip()
+                t_tag = s.css_first("h1")
+                if t_tag: t = t_tag.text().strip()
             if not a and page_type == "book":
-                a_tag = s.find("a", href=lambda x: x and "/Author/" in x)
-                if a_tag: a = a_tag.text.strip()
+                a_tag = s.css_first('a[href*="/Author/"]')
+                if a_tag: a = a_tag.text().strip()
         elif site == "steimatzky":
             if not t:
-                t_tag = s.find("span", {"itemprop": "name"})
-                if t_tag: t = t_tag.text.strip()
+                t_tag = s.css_first('span[itemprop="name"]')
+                if t_tag: t = t_tag.text().strip()
             if not a:
-                a_tag = s.find("div", {"class": "product-author"})
-                if a_tag: a = a_tag.text.strip()
+                a_tag = s.css_first("div.product-author")
+                if a_tag: a = a_tag.text().strip()
         elif site == "simania":
             if not t:
-                t_tag = s.find("h2")
-                if t_tag: t = t_tag.text.strip()
+                t_tag = s.css_first("h2")
+                if t_tag: t = t_tag.text().strip()
             if not a:
-                a_tag = s.find("h3")
-                if a_tag: a = a_tag.text.strip()
+                a_tag = s.css_first("h3")
+                if a_tag: a = a_tag.text().strip()
         
         if page_type in ["author", "group"] and target_title:
             # Try to find the book on this page
             norm_target = normalize_hebrew(target_title)
             
             # 1. Search in <a> tags
-            links = s.find_all("a", href=lambda x: x and "/Product/" in x)
-            for link in links:
-                link_text = link.text.strip()
+            candidates = []
+            for link in s.css('a[href*="/Product/"]'):
+                link_text = link.text().strip()
                 if not link_text:
-                    img = link.find("img")
-                    if img and img.get("alt"): link_text = img.get("alt").strip()
-                
-                if link_text and fuzz.token_set_ratio(norm_target, normalize_hebrew(link_text)) >= 85:
-                    book_url = link['href']
-                    if not book_url.startswith("http"):
-                        from urllib.parse import urljoin
-                        book_url = urljoin(url, book_url)
-                    match = re.search(site_config["id_regex"], book_url)
-                    return {
-                        "url": book_url,
-                        "id": match.group(1) if match else None,
-                        "title": link_text,
-                        "author": t if page_type == "author" else "",
-                        "site": site,
-                        "type": "book_from_author_page",
-                        "parent_url": url
-                    }
+                    img = link.css_first("img")
+                    if img and img.attributes.get("alt"): link_text = img.attributes["alt"].strip()
+                if link_text: candidates.append((link_text, link))
+            
+            i = best_match(norm_target, [normalize_hebrew(c[0]) for c in candidates], 85)
+            if i is not None:
+                link_text, link = candidates[i]
+                book_url = link.attributes["href"]
+                if not book_url.startswith("http"):
+                    from urllib.parse import urljoin
+                    book_url = urljoin(url, book_url)
+                match = site_config["id_regex"].search(book_url)
+                return {
+                    "url": book_url,
+                    "id": match.group(1) if match else None,
+                    "title": link_text,
+                    "author": t if page_type == "author" else "",
+                    "site": site,
+                    "type": "book_from_author_page",
+                    "parent_url": url
+                }
             
             # 2. Search in script tags (for React-rendered pages like Evrit)
             if site == "evrit":
-                all_scripts = s.find_all("script")
+                all_scripts = s.css("script")
                 for script in all_scripts:
-                    if script.string and "ProductListItems" in script.string:
+                    script_text = script.text()
+                    if "ProductListItems" in script_text:
                         try:
                             # Extract JSON-like content from script
                             # Look for ProductListItems: [...]
-                            m = re.search(r'"ProductListItems":\s*(\[.*?\])', script.string, re.DOTALL)
+                            m = _PRODUCT_LIST_RE.search(script_text)
                             if m:
-                                items = json.loads(m.group(1))
-                                for item in items:
-                                    item_name = item.get("Name", "")
-                                    if item_name and fuzz.token_set_ratio(norm_target, normalize_hebrew(item_name)) >= 85:
-                                        pid = str(item.get("ProductID"))
-                                        # Construct URL: https://www.e-vrit.co.il/Product/ID/Name
-                                        safe_name = item_name.replace(" ", "_")
-                                        book_url = f"https://www.e-vrit.co.il/Product/{pid}/{safe_name}"
-                                        return {
-                                            "url": book_url,
-                                            "id": pid,
-                                            "title": item_name,
-                                            "author": t if page_type == "author" else item.get("AuthorName", ""),
-                                            "site": site,
-                                            "type": "book_from_author_page",
-                                            "parent_url": url
-                                        }
+                                items = [item for item in json.loads(m.group(1)) if item.get("Name")]
+                                i = best_match(norm_target, [normalize_hebrew(item["Name"]) for item in items], 85)
+                                if i is not None:
+                                    item = items[i]
+                                    item_name = item["Name"]
+                                    pid = str(item.get("ProductID"))
+                                    # Construct URL: https://www.e-vrit.co.il/Product/ID/Name
+                                    url_name = item_name.replace(" ", "_")
+                                    book_url = f"https://www.e-vrit.co.il/Product/{pid}/{url_name}"
+                                    return {
+                                        "url": book_url,
+                                        "id": pid,
+                                        "title": item_name,
+                                        "author": t if page_type == "author" else item.get("AuthorName", ""),
+                                        "site": site,
+                                        "type": "book_from_author_page",
+                                        "parent_url": url
+                                    }
                         except Exception as e:
                             if v >= 2: print(f"DEBUG: Error parsing script JSON: {e}")
         
         return {"title": t, "author": a, "id": bid, "type": page_type}
     except Exception: return None
 
-def search_book_on_site(q, s, v):
+def ddg_search(search_query, max_results):
+    # Search results are kept in the disk cache by search_urls, not in the HTTP cache
+    r = fetch(SEARCH_URL, params={"q": search_query, "kl": "il-he"}, timeout=10, expire_after=requests_cache.DO_NOT_CACHE)
+    # DDG answers 202 with an empty page when it throttles
+    if r.status_code != 200: raise HTTPError(f"DDG returned {r.status_code}", response=r)
+    urls = []
+    for a in LexborHTMLParser(r.content).css("a.result__a"):
+        href = a.attributes.get("href") or ""
+        # Result links go through DDG's redirector: //duckduckgo.com/l/?uddg=<target>
+        href = parse_qs(urlparse(href).query).get("uddg", [href])[0]
+        if href.startswith("http"): urls.append(href)
+        if len(urls) >= max_results: break
+    return urls
+
+def search_urls(search_query, v, max_results=5):
+    key = f"ddg::{search_query}"
+    # Concurrent site searches share the combined query; only one of them fetches it
+    with _SEARCH_LOCKS.setdefault(key, threading.Lock()):
+        urls = get_disk_cache().get(key)
+        if urls is not None:
+            if v >= 1: print(f"  DEBUG: Cached search: {search_query}")
+            return urls
+        if key in _SEARCH_FAILURES: raise _SEARCH_FAILURES[key]
+        try:
+            for attempt in range(SEARCH_RETRIES):
+                try:
+                    urls = ddg_search(search_query, max_results)
+                    break
+                except HTTPError as e:
+                    # Only the throttle page lands here; connection errors and 429/5xx were already retried by the session's Retry
+                    if attempt == SEARCH_RETRIES - 1: raise
+                    # One second floor plus exponential backoff with full jitter
+                    delay = 1.0 + random.uniform(0, 2 ** attempt)
+                    if v >= 1: print(f"  DEBUG: DDG Error: {e}, retrying in {delay:.1f}s")
+                    time.sleep(delay)
+        except Exception as e:
+            _SEARCH_FAILURES[key] = e
+            raise
+        # An empty page may be a bot check or a markup change rather than a real miss; don't pin it for a week
+        if urls: get_disk_cache().set(key, urls, expire=CACHE_TTL)
+        return urls
+
+def search_book_on_site(q, s, v, stop=None):
     try:
         norm_q = normalize_hebrew(q)
         
@@ -243,7 +438,7 @@ def search_book_on_site(q, s, v):
         book_title_only = norm_q
         
         if "(" in norm_q:
-            m = re.match(r'(.*?)\s*\((.*?)\)', norm_q)
+            m = _TITLE_AUTHOR_RE.match(norm_q)
             if m:
                 book_title_only = m.group(1).strip()
         elif " - " in norm_q:
@@ -256,47 +451,54 @@ def search_book_on_site(q, s, v):
         
         # If query contains parentheses, add a version without them
         if "(" in norm_q:
-            no_paren = re.sub(r'\(.*?\)', '', norm_q).strip()
+            no_paren = _PARENS_RE.sub('', norm_q).strip()
             if no_paren not in queries:
                 queries.append(no_paren)
         
         best_author_match = None
 
         for query in queries:
-            strategies = [f"site:{s['domain']} {query}", f"{query} {s['name']}"]
+            # The combined query returns a single results page shared by all sites, so one site can crowd
+            # the others out; the per-site site: query only runs when this domain got no URLs from it
+            strategies = [(f"{query} {SITES_FILTER}", SEARCH_PAGE_RESULTS, False), (f"site:{s['domain']} {query}", 5, True), (f"{query} {s['name']}", 5, False)]
+            domain_seen = False
             
-            for search_query in strategies:
+            for search_query, max_results, fallback in strategies:
+                if fallback and domain_seen: continue
+                # Another site already won for this book; stop issuing requests
+                if stop and stop.is_set(): return None
                 if v >= 1: print(f"DEBUG: Querying {search_query}")
                 try:
-                    results = list(DDGS().text(search_query, region="il-he", max_results=5))
+                    urls = search_urls(search_query, v, max_results)
                 except Exception as e:
                     if v >= 1: print(f"  DEBUG: DDG Error: {e}")
                     continue
 
-                for r in results:
-                    url = r['href']
+                for url in urls:
                     if v >= 1: print(f"  DEBUG: DDG URL: {url}")
                     if s["domain"] in url:
+                        domain_seen = True
+                        if stop and stop.is_set(): return None
                         d = get_book_details(url, s["name"], s, target_title=query, v=v)
                         if d:
                             if d.get("type") == "book_from_author_page":
                                 return d
                             
                             norm_d_title = normalize_hebrew(d["title"])
-                            r1 = fuzz.token_set_ratio(normalize_hebrew(query), norm_d_title)
-                            r2 = fuzz.token_set_ratio(normalize_hebrew(book_title_only), norm_d_title)
+                            r1 = fuzzy_ratio(normalize_hebrew(query), norm_d_title, 80)
+                            r2 = fuzzy_ratio(normalize_hebrew(book_title_only), norm_d_title, 80)
                             
                             if v >= 1: print(f"  DEBUG: Title '{d['title']}' Ratios: {r1}, {r2} (Type: {d.get('type')})")
                             
                             if d.get("type") == "book":
-                                if r1 >= 80 or r2 >= 80:
+                                if r1 or r2:
                                     bid = d.get("id")
                                     if not bid:
-                                        match = re.search(s["id_regex"], url)
+                                        match = s["id_regex"].search(url)
                                         bid = match.group(1) if match else None
                                     return {"url": url, "id": bid, "title": d["title"], "author": d["author"], "site": s["name"], "type": "book"}
                             elif d.get("type") in ["author", "group"]:
-                                if r1 >= 80 or r2 >= 80:
+                                if r1 or r2:
                                     if not best_author_match:
                                         best_author_match = {"url": url, "id": None, "title": d["title"], "author": "", "site": s["name"], "type": d.get("type")}
         
@@ -316,27 +518,47 @@ def process_book(f_path, use_llm, model, v):
     elif llm_t: q = llm_t
     else: q = clean_filename(fname_no_ext)
 
+    tokens = [t for t in q.split() if t.casefold() not in QUERY_STOPWORDS]
+    if len("".join(tokens)) < MIN_QUERY_CHARS:
+        print(f"{Fore.YELLOW}Skipping: {Style.DIM}{fname}{Style.RESET_ALL} {Fore.YELLOW}(nothing to search for){Style.RESET_ALL}")
+        return {"file": f_path, "original_filename": fname, "llm_guess": {"title": llm_t, "author": llm_a}, "result": None}
+
     print(f"{Fore.LIGHTBLUE_EX}Searching: {Style.DIM}{fname}{Style.RESET_ALL}")
-    for site in SITES:
-        res = search_book_on_site(q, site, v)
-        if res:
-            print(f"  {Fore.GREEN}✓ Found on {site["name"]}: {res["title"]} (ID: {res['id']}){Style.RESET_ALL}")
-            return {"file": f_path, "original_filename": fname, "llm_guess": {"title": llm_t, "author": llm_a}, "result": res}
+    # Query all sites at once; a hit is accepted once every higher-priority site has missed
+    pool = ThreadPoolExecutor(max_workers=len(SITES))
+    stop = threading.Event()
+    futures = {pool.submit(search_book_on_site, q, site, v, stop): i for i, site in enumerate(SITES)}
+    results = {}
+    try:
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            for i in range(len(SITES)):
+                if i not in results or results[i]: break
+            res = results.get(i)
+            if res:
+                print(f"  {Fore.GREEN}✓ Found on {res["site"]}: {res["title"]} (ID: {res['id']}){Style.RESET_ALL}")
+                return {"file": f_path, "original_filename": fname, "llm_guess": {"title": llm_t, "author": llm_a}, "result": res}
+    finally:
+        # Losing searches finish their current request, then see the event and return
+        stop.set()
+        pool.shutdown(wait=False)
     return {"file": f_path, "original_filename": fname, "llm_guess": {"title": llm_t, "author": llm_a}, "result": None}
 
 def organize_file(b_data, out_dir, dry_run):
     f_path, res = b_data["file"], b_data["result"]
     if not res: return None
-    def safe(n):
-        for char in ["/", "\\", "*", "?", ":", "\"", "<", ">", "|"]: n = n.replace(char, "")
-        return n.strip().replace(" ", "_")
-    new_f = f"{safe(res["author"] or "Unknown")}_{safe(res["title"] or "Unknown")}{os.path.splitext(f_path)[1]}"
+    new_f = f"{safe_name(res["author"] or "Unknown")}_{safe_name(res["title"] or "Unknown")}{os.path.splitext(f_path)[1]}"
     target = os.path.join(out_dir, f"found_on_{res["site"]}")
     if dry_run: return os.path.join(target, new_f)
     os.makedirs(target, exist_ok=True)
     n_path = os.path.join(target, new_f)
     try:
-        shutil.move(f_path, n_path)
+        try:
+            os.replace(f_path, n_path)
+        except OSError as e:
+            # Only a move across filesystems needs the copy + delete fallback
+            if e.errno != errno.EXDEV: raise
+            shutil.move(f_path, n_path)
         print(f"  {Fore.MAGENTA}→ Moved to {res["site"]}/{new_f}{Style.RESET_ALL}")
         return n_path
     except Exception: return None
@@ -344,8 +566,9 @@ def organize_file(b_data, out_dir, dry_run):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--input", "-i", required=True)
-    parser.add_argument("--threads", "-t", type=int, default=4)
+    parser.add_argument("--threads", "-t", type=int, default=8)
     parser.add_argument("--verbose", "-v", action="count", default=0)
+    parser.add_argument("--processes", action="store_true", help="run workers as processes instead of threads")
     parser.add_argument("--use-llm", action="store_true")
     parser.add_argument("--model", default="llama3.1")
     parser.add_argument("--dry-run", action="store_true")